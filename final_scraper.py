@@ -1,11 +1,15 @@
 import pandas as pd
 import requests
 import logging
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from io import StringIO
+import lxml.html
+from lxml import etree
 from datawrapper import Datawrapper
 import os
 from dotenv import load_dotenv
+from functools import lru_cache
 
 
 ### Preparations #####
@@ -13,6 +17,7 @@ logging.basicConfig(level=logging.INFO)
 
 # Constants
 URL = "https://en.wikipedia.org/wiki/Star_Wars"
+_TABLE_XPATH = etree.XPath("//table[contains(@class, 'wikitable plainrowheaders')]") # compiled once
 
 #Load environment variables
 load_dotenv()  
@@ -22,13 +27,24 @@ if not API_KEY:
 
 dw = Datawrapper(access_token=API_KEY)
 
+# One shared session so the TCP/TLS connection to Wikipedia is reused between calls
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": "star-wars-scraper/1.0"})
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4,
+                                       pool_maxsize=8,
+                                       max_retries=Retry(total=3,
+                                                         backoff_factor=0.3,
+                                                         status_forcelist=[429, 500, 502, 503, 504],
+                                                         raise_on_status=False)))
 
-def scrape_website_requests(url:str) -> requests.Response:
+
+def scrape_website_requests(url:str, stream:bool = False) -> requests.Response:
     """
     Scrapes a website using requests and returns the response.
     
     Args:
         url (str): The URL to scrape.
+        stream (bool): If True, the body is not downloaded until it is read from response.raw.
     
     Returns:
         requests.Response: The response object.
@@ -36,55 +52,76 @@ def scrape_website_requests(url:str) -> requests.Response:
     Raises:
         requests.exceptions.RequestException: If any request-related error occurs.
     """
+    response = None
     try:
-        response = requests.get(url)
+        response = _SESSION.get(url, stream=stream, timeout=10)
         response.raise_for_status()
         return response
     
     except requests.exceptions.RequestException as e:
         logging.error(f"Request error: {e}")
+        if response is not None:
+            response.close() # a streamed body is never read, so release its pooled connection
         raise
     
 ####### Extracting the data #######
 
-def extract_films(URL:str, table_index:int, class_name:str ) -> pd.DataFrame:
+@lru_cache(maxsize=1)
+def _fetch_tables(url:str) -> tuple:
     """
-    Extracts film data from a Wikipedia page containing film data.
+    Downloads a page and returns its film tables, cached for the last URL.
+    The cached tables keep the parsed page alive, so only one page is kept.
     
     Args:
         url (str): The URL of the Wikipedia page.
+    
+    Returns:
+        tuple: The table elements matching the film table class.
+    """
+    # The body is parsed while it streams in instead of being downloaded into memory first
+    with scrape_website_requests(url, stream=True) as response:
+        response.raw.decode_content = True # let urllib3 undo the gzip encoding
+        tree = lxml.html.parse(response.raw)
+    return tuple(_TABLE_XPATH(tree))
+
+def extract_films(tables:tuple, table_index:int) -> pd.DataFrame:
+    """
+    Extracts film data from the tables of an already parsed Wikipedia page.
+    
+    Args:
+        tables (tuple): The table elements selected from the parsed page.
         table_index (int): The index of the table to extract.
-        class_name (str): The class name pattern to select the table.
     
     Returns:
         pd.DataFrame: A DataFrame containing the extracted film data.
     """
-    response = scrape_website_requests(URL)
-    soup = BeautifulSoup(response.content, "html.parser")
-    tables = soup.select(f"table[class*='{class_name}']")
-    
     # Check if the table's index is not out of the range of the table
     if table_index >= len(tables):
         raise IndexError("Table index out of range.")
     
-    table = tables[table_index]
-    df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
+    table = etree.tostring(tables[table_index], encoding="unicode")
+    df = pd.read_html(StringIO(table), header = 0)[0] # needed for the multilines headers
     return df
 
 ####### Cleaning the data #######
 def transform_date(df:pd.DataFrame) -> pd.DataFrame:
     """
     Converts the 'U.S. release date' column to datetime.
+    Films whose date does not match the Wikipedia format (e.g. "TBA") are dropped with a warning.
     
     Args:
-        df (pd.DataFrame): DataFrame with the 'U.S. release date' column.
+        df (pd.DataFrame): DataFrame with the 'Film' and 'U.S. release date' columns.
     
     Returns:
-        pd.DataFrame: DataFrame with the transformed date column.
+        pd.DataFrame: A new DataFrame with the transformed date column.
     """
 
-    df["U.S. release date"] = pd.to_datetime(df["U.S. release date"])
-    return df
+    release_dates = pd.to_datetime(df["U.S. release date"], format="%B %d, %Y", errors="coerce")
+    undated = release_dates.isna()
+    if undated.any():
+        logging.warning(f"Dropping films without a valid U.S. release date: {df.loc[undated, 'Film'].tolist()}")
+
+    return df.assign(**{"U.S. release date": release_dates}).loc[~undated]
 
 def process_films(df: pd.DataFrame, needed_flag: bool)-> pd.DataFrame:
     """
@@ -98,25 +135,14 @@ def process_films(df: pd.DataFrame, needed_flag: bool)-> pd.DataFrame:
         pd.DataFrame: A cleaned DataFrame with selected columns.
     """
      
-    df = df.copy()
- 
     if needed_flag:
-        df["Trilogy"] = None
-
-        trilogy = ""
-        for index, row in df.iterrows():
-
-            if "trilogy" in row["Film"]:
-                trilogy = row["Film"]
-            else:
-                    df.at[index,'Trilogy'] = trilogy 
+        # The trilogy header rows are carried down to the films below them
+        is_trilogy = df["Film"].str.contains("trilogy", case=False, regex=False, na=False)
+        df = df.assign(Trilogy=df["Film"].where(is_trilogy).ffill())
             
-        df = df[~df["Film"].str.contains("trilogy")]
-        df["U.S. release date"] = pd.to_datetime(df["U.S. release date"])
-    else:
-        df["U.S. release date"] = pd.to_datetime(df["U.S. release date"])
+        df = df.loc[~is_trilogy]
     
-    return df.iloc[:,0:2]
+    return df[["Film", "U.S. release date"]]
 
 def prepare_dw_data(film_category:dict) -> pd.DataFrame:
     """
@@ -128,20 +154,24 @@ def prepare_dw_data(film_category:dict) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Processed DataFrame ready for visualization.
     """
+    # Fetch and parse the page only once, all the categories live on the same page
+    tables = _fetch_tables(URL)
+
     film_data = {}
     for category, index in film_category.items():
-        film_data[category] = extract_films(URL, index, 'wikitable plainrowheaders')
+        film_data[category] = extract_films(tables, index)
 
     skywalker_films = process_films(film_data["Skywalker Films"], True)
     standalone_films = process_films(film_data["Standalone Films"], False)
     special_films = process_films(film_data["Special Films"], False)
-    df = pd.concat([skywalker_films, standalone_films, special_films])
+    df = pd.concat([skywalker_films, standalone_films, special_films], ignore_index=True)
+    df = transform_date(df) # converted once for all the categories
 
 
     ##### Prep for the DW visualization ##########
-    df["Year"] = df['U.S. release date'].dt.year
-    df.sort_values(by = "Year", ascending=True, inplace=True)
-    dw_data = df[["Film", "Year"]]
+    df = df.assign(Year=df['U.S. release date'].dt.year.astype("int16"))
+    dw_data = df[["Film", "Year"]].sort_values(by = "Year", ascending=True, kind="stable", ignore_index=True)
+    dw_data = dw_data.assign(Film=dw_data["Film"].astype("category"))
 
     logging.info(f"Data prepared for Datawrapper:\n{dw_data}")
 
@@ -150,7 +180,7 @@ def prepare_dw_data(film_category:dict) -> pd.DataFrame:
 
 ####### DataWrapper #######
 
-def create_dw_chart(dw_data:pd.DataFrame) -> str:
+def create_dw_chart(dw_data:pd.DataFrame) -> tuple[str, str]:
     """
     Creates a Datawrapper chart with the given data.
     
@@ -158,28 +188,30 @@ def create_dw_chart(dw_data:pd.DataFrame) -> str:
         dw_data (pd.DataFrame): DataFrame with visualization data.
     
     Returns:
-        str: The chart ID of the newly created chart.
+        tuple[str, str]: The chart ID and the title of the newly created chart.
     """
+    title = "Movies Release Timeline"
     new_chart = dw.create_chart(
-        title="Movies Release Timeline",
+        title=title,
         chart_type="d3-dot-plot" ,  
         data = dw_data
     )
 
-    return new_chart.get("id")
+    return new_chart.get("id"), title
 
 
-def update_dw_chart(chart_id:str) -> str:
+def update_dw_chart(chart_id:str, title:str, dw_data:pd.DataFrame) -> str:
     """
     Updates the Datawrapper chart with additional metadata and description.
     
     Args:
         chart_id (str): The chart ID to update.
+        title (str): The title the chart was created with.
+        dw_data (pd.DataFrame): The chart data, used for the X-axis range.
     """
         
-    # Fetch chart details to get the existing title
-    chart_details = dw.get_chart(chart_id)
-    current_title = str(chart_details.get("title", "Movies Release Timeline"))  # Ensure title is a string
+    # The X-axis spans exactly the release years in the data
+    year_min, year_max = int(dw_data["Year"].min()), int(dw_data["Year"].max())
 
     # Define the source information
     source_name = "Wikipedia"
@@ -188,7 +220,7 @@ def update_dw_chart(chart_id:str) -> str:
     # Correct way to update the chart
     dw.update_chart(
         chart_id=chart_id,
-        title=current_title,  #  Required to prevent errors
+        title=title,  #  Required to prevent errors
         metadata={
             "visualize": {
                 "axes": {
@@ -197,7 +229,7 @@ def update_dw_chart(chart_id:str) -> str:
                     },
                     "bottom": {  
                         "scale": "time",  #  Treat the X-axis as a date
-                        "custom-range": [str(2015), str(2017)],  #  Set exact range for X-axis
+                        "custom-range": [str(year_min), str(year_max)],  #  Set exact range for X-axis
                         "custom-tick-format": "%Y"  #  Display only the year (YYYY)
 
                     }
@@ -220,8 +252,8 @@ def main():
                     "Standalone Films": 1,
                     "Special Films": 4}
     dw_data = prepare_dw_data(film_category)
-    chart_id = create_dw_chart(dw_data)
-    update_dw_chart(chart_id)
+    chart_id, title = create_dw_chart(dw_data)
+    update_dw_chart(chart_id, title, dw_data)
     return "Done"
 
 if __name__ == "__main__":
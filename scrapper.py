@@ -1,11 +1,23 @@
 import pandas as pd
 import requests
 import logging
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from io import StringIO
 from urllib.request import Request, urlopen
 from datetime import datetime
+from functools import lru_cache
 url = "https://en.wikipedia.org/wiki/Star_Wars"
+TABLE_SELECTOR = "table[class*='wikitable plainrowheaders']"
+
+# Reuse one pooled connection for all the requests to Wikipedia
+session = requests.Session()
+session.headers.update({"User-Agent": "star-wars-scraper/1.0"})
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8,
+                                      max_retries=Retry(total=3, backoff_factor=0.3,
+                                                        status_forcelist=[429, 500, 502, 503, 504],
+                                                        raise_on_status=False)))
 
 ''' 
 requests.raise_for_status -> needs for checking the status codes 
@@ -28,7 +40,7 @@ We could have either more detailed approach for exception handling or add only t
 
 def scrape_website_requests(url):
     try:
-        response = requests.get(url)
+        response = session.get(url, timeout=10)
         response.raise_for_status()
         return response
     
@@ -53,12 +65,10 @@ The .content is better to use as it holds raw bytes,
 and can decode better then the text representation of the .text
 '''
 def extract_data(url):
-    response = scrape_website_requests(url)
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = _fetch_soup(url)
     table = soup.find("table", class_='wikitable plainrowheaders')
     df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
     # df = pd.concat(df)
-    df.to_csv("star_wars.csv", index = False)
     return df
 
 def transform_date(df):
@@ -73,15 +83,17 @@ def remove_extra_columns(df, column_name):
 
 def process_skywalker_films(df):
     df = extract_data(url)
-    df["Trilogy"] = None
-
+    # Collect the labels in a plain list and write the column once instead of df.at per row
+    trilogies = []
     trilogy = ""
-    for index, row in df.iterrows():
+    for film in df["Film"].tolist():
 
-        if "trilogy" in row["Film"]:
-            trilogy = row["Film"]
+        if "trilogy" in film:
+            trilogy = film
+            trilogies.append(None)
         else:
-                df.at[index,'Trilogy'] = trilogy ## Iterrows are just a copy, they just 
+            trilogies.append(trilogy)
+    df["Trilogy"] = trilogies
         
     df = df[~df["Film"].str.contains("trilogy")]
 
@@ -106,73 +118,31 @@ def process_standalone_films(df):
 
 #Next Steps: Download the rest of the tables + create a function
 # Documentation: https://www.educative.io/answers/how-to-find-elements-by-class-using-beautiful-soup 
-def extract_standalone_films(url):
-    
-    response = scrape_website_requests(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    table = soup.select("table[class*='wikitable plainrowheaders']")[1]
-
-    df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
-    # df = pd.concat(df)
-    df.to_csv("star_wars.csv", index = False)
-    return df
-
-
-# print(extract_standalone_films(url))
-
-def extract_upcoming_movies(url):
-    response = scrape_website_requests(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    table = soup.select("table[class*='wikitable plainrowheaders']")[2]
-    df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
-    # df = pd.concat(df)
-    df.to_csv("star_wars.csv", index = False)
-    return df
-
-#print(extract_upcoming_movies(url)) # Difference in the Status
-def extract_television_series(url):
+@lru_cache(maxsize=4)
+def _fetch_soup(url):
+    # All the tables live on the same page, so it is downloaded and parsed only once
     response = scrape_website_requests(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    table = soup.select("table[class*='wikitable plainrowheaders']")[3]
-    df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
-    # df = pd.concat(df)
-    df.to_csv("star_wars.csv", index = False)
-    return df
+    return BeautifulSoup(response.content, "lxml")
 
-# print(extract_television_series(url))
+def extract_films(soup, index):
+    table = soup.select(TABLE_SELECTOR)[index]
 
-def extract_special_films(url):
-    response = scrape_website_requests(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    table = soup.select("table[class*='wikitable plainrowheaders']")[4]
     df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
     # df = pd.concat(df)
-    df.to_csv("star_wars.csv", index = False)
-    return df
-
-# print(extract_special_films(url))
-
-def extract_films(url, index):
-    
-    response = scrape_website_requests(url)
-    soup = BeautifulSoup(response.content, "html.parser")
-    table = soup.select("table[class*='wikitable plainrowheaders']")[index]
-
-    df = pd.read_html(StringIO(str(table)), header = 0)[0] # needed for the multilines headers
-    # df = pd.concat(df)
-    df.to_csv("star_wars.csv", index = False)
     return df
 
 #Extract several tables
-skywalker_films = extract_films(url, 0)
+soup = _fetch_soup(url)
+
+skywalker_films = extract_films(soup, 0)
 skywalker_films = process_skywalker_films(skywalker_films)
 
-standalone_films = extract_films(url, 1)
+standalone_films = extract_films(soup, 1)
 standalone_films = process_standalone_films(standalone_films)
 
-upcoming_films = extract_films(url, 2)
-tv_series = extract_films(url, 3) # has the same multi-index lines
-special_films = extract_films(url, 4)
+upcoming_films = extract_films(soup, 2)
+tv_series = extract_films(soup, 3) # has the same multi-index lines
+special_films = extract_films(soup, 4)
 
 print(upcoming_films)
 